@@ -6,10 +6,11 @@ Analyzes top US stocks and recommends top 5 picks using AI
 
 import os
 import json
+import time
+import argparse
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-import yfinance as yf
-from openai import OpenAI
 
 # Top US stocks to analyze (can be expanded)
 STOCK_SYMBOLS = [
@@ -19,26 +20,171 @@ STOCK_SYMBOLS = [
     'CSCO', 'PEP', 'TMO'
 ]
 
-def get_stock_data(symbol):
-    """Fetch stock data and metrics"""
+# Fetches are network-bound, so threads mostly wait on sockets
+FETCH_WORKERS = 16
+# Yahoo's chart endpoint accepts roughly 20 symbols per request
+HISTORY_BATCH_SIZE = 20
+# Close offsets for 1D/1W/1M/3M changes (0 is the first close in the window)
+PRICE_CHANGE_OFFSETS = (-2, -5, -20, 0)
+# History must be longer than this for each change to be reported (else 0)
+PRICE_CHANGE_MIN_LENGTHS = (1, 5, 20, 0)
+
+# Stock fields sent to the AI prompt, in column order
+STOCKS_TSV_FIELDS = [
+    'symbol', 'current_price', 'market_cap', 'pe_ratio',
+    'price_change_1d', 'price_change_1w', 'price_change_1m', 'price_change_3m',
+    'volume_ratio', 'sector', 'analyst_target', 'recommendation'
+]
+STOCKS_TSV_HEADER = "sym\tprice\tmcap\tpe\t1d\t1w\t1m\t3m\tvol\tsec\ttgt\trec"
+
+# Structured output schema for the AI analysis; strict mode guarantees valid JSON
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "analysis_date": {"type": "string"},
+        "market_summary": {"type": "string"},
+        "top_picks": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "rank": {"type": "integer"},
+                    "symbol": {"type": "string"},
+                    "current_price": {"type": "number"},
+                    "reason": {"type": "string"},
+                    "target_price": {"type": "number"},
+                    "risk_level": {"type": "string", "enum": ["Low", "Medium", "High"]},
+                    "time_horizon": {"type": "string", "enum": ["Short-term", "Medium-term", "Long-term"]}
+                },
+                "required": [
+                    "rank", "symbol", "current_price", "reason",
+                    "target_price", "risk_level", "time_horizon"
+                ],
+                "additionalProperties": False
+            }
+        },
+        "overall_strategy": {"type": "string"}
+    },
+    "required": ["analysis_date", "market_summary", "top_picks", "overall_strategy"],
+    "additionalProperties": False
+}
+
+# Market data changes at most once per trading day, so same-day runs reuse it
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'stock_analyzer')
+CACHE_TTL_SECONDS = 6 * 3600
+
+def cache_path(deep=False):
+    """Path of today's stock data cache file"""
+    suffix = '-deep' if deep else ''
+    return os.path.join(CACHE_DIR, f"{datetime.utcnow().date()}{suffix}.json")
+
+def load_cached_stock_data(deep=False):
+    """Load today's cached stock data, dropping entries older than the TTL"""
+    try:
+        with open(cache_path(deep)) as f:
+            entries = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    now = time.time()
+    return {
+        symbol: entry['data']
+        for symbol, entry in entries.items()
+        if now - entry['fetched_at'] < CACHE_TTL_SECONDS
+    }
+
+def save_cached_stock_data(stocks_data, deep=False):
+    """Merge freshly fetched stock data into today's cache file"""
+    path = cache_path(deep)
+    try:
+        with open(path) as f:
+            entries = json.load(f)
+    except (OSError, ValueError):
+        entries = {}
+
+    now = time.time()
+    for data in stocks_data:
+        entries[data['symbol']] = {'fetched_at': now, 'data': data}
+
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Write then rename so concurrent runs never read a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Error writing stock data cache: {e}")
+
+def fetch_history_batch(symbols):
+    """Fetch 3-month price history for a batch of symbols in one request"""
+    import yfinance as yf
+
+    try:
+        df = yf.download(
+            " ".join(symbols),
+            period='3mo',
+            group_by='ticker',
+            auto_adjust=True,
+            threads=True,
+            progress=False
+        )
+    except Exception as e:
+        print(f"Error fetching history for {', '.join(symbols)}: {e}")
+        return {}
+
+    if df.empty:
+        return {}
+
+    # Older yfinance returns flat columns for a single-ticker download
+    if df.columns.nlevels == 1:
+        return {symbols[0]: df.dropna(subset=['Close'])} if len(symbols) == 1 else {}
+
+    # Symbols with no data are left out so callers treat them as failed fetches
+    tickers = set(df.columns.get_level_values(0))
+    return {
+        symbol: df[symbol].dropna(subset=['Close'])
+        for symbol in symbols if symbol in tickers
+    }
+
+def fetch_info(symbol, deep=False):
+    """
+    Fetch company info for a single symbol
+
+    The default pass only reads market cap from fast_info; the full info
+    scrape (name, P/E, sector, analyst data) is slow and only done if deep.
+    """
+    import yfinance as yf
+
     try:
         stock = yf.Ticker(symbol)
-        info = stock.info
-        hist = stock.history(period='3mo')
+        if deep:
+            return stock.info
+        return {'marketCap': stock.fast_info.market_cap}
+    except Exception as e:
+        print(f"Error fetching info for {symbol}: {e}")
+        return {}
+
+def get_stock_data(symbol, hist, info):
+    """Calculate stock metrics from price history and company info"""
+    import numpy as np
 
-        if hist.empty:
+    try:
+        if hist is None or hist.empty:
             return None
 
-        # Calculate metrics
-        current_price = hist['Close'].iloc[-1]
-        price_change_1d = ((current_price - hist['Close'].iloc[-2]) / hist['Close'].iloc[-2] * 100) if len(hist) > 1 else 0
-        price_change_1w = ((current_price - hist['Close'].iloc[-5]) / hist['Close'].iloc[-5] * 100) if len(hist) > 5 else 0
-        price_change_1m = ((current_price - hist['Close'].iloc[-20]) / hist['Close'].iloc[-20] * 100) if len(hist) > 20 else 0
-        price_change_3m = ((current_price - hist['Close'].iloc[0]) / hist['Close'].iloc[0] * 100)
+        # Calculate metrics: 1D, 1W, 1M and 3M changes against the latest close
+        closes = hist['Close'].to_numpy(dtype=float)
+        offsets = np.array(PRICE_CHANGE_OFFSETS)
+        valid = len(closes) > np.array(PRICE_CHANGE_MIN_LENGTHS)
+        base = closes[np.where(valid, offsets, 0)]
+        changes = np.where(valid, (closes[-1] / base - 1.0) * 100.0, 0.0)
+        price_change_1d, price_change_1w, price_change_1m, price_change_3m = np.round(changes, 2)
+        current_price = closes[-1]
 
-        avg_volume = hist['Volume'].mean()
-        current_volume = hist['Volume'].iloc[-1]
-        volume_ratio = current_volume / avg_volume if avg_volume > 0 else 1
+        volumes = hist['Volume'].to_numpy(dtype=float)
+        avg_volume = volumes.mean()
+        volume_ratio = volumes[-1] / avg_volume if avg_volume > 0 else 1
 
         return {
             'symbol': symbol,
@@ -46,10 +192,10 @@ def get_stock_data(symbol):
             'current_price': round(current_price, 2),
             'market_cap': info.get('marketCap', 0),
             'pe_ratio': info.get('forwardPE', info.get('trailingPE', 'N/A')),
-            'price_change_1d': round(price_change_1d, 2),
-            'price_change_1w': round(price_change_1w, 2),
-            'price_change_1m': round(price_change_1m, 2),
-            'price_change_3m': round(price_change_3m, 2),
+            'price_change_1d': price_change_1d,
+            'price_change_1w': price_change_1w,
+            'price_change_1m': price_change_1m,
+            'price_change_3m': price_change_3m,
             'volume_ratio': round(volume_ratio, 2),
             'sector': info.get('sector', 'N/A'),
             'industry': info.get('industry', 'N/A'),
@@ -57,25 +203,34 @@ def get_stock_data(symbol):
             'recommendation': info.get('recommendationKey', 'N/A')
         }
     except Exception as e:
-        print(f"Error fetching data for {symbol}: {e}")
+        print(f"Error processing data for {symbol}: {e}")
         return None
 
+_openai_client = None
+
+def get_openai_client():
+    """Return a shared OpenAI client so connections are reused across calls"""
+    global _openai_client
+    if _openai_client is None:
+        import httpx
+        from openai import OpenAI
+
+        _openai_client = OpenAI(
+            api_key=os.environ.get('OPENAI_API_KEY'),
+            http_client=httpx.Client(http2=True, timeout=60)
+        )
+    return _openai_client
+
 def analyze_stocks_with_ai(stocks_data):
     """Use OpenAI to analyze stocks and pick top 5"""
-    client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
+    client = get_openai_client()
 
-    # Prepare data for AI analysis
-    stocks_summary = []
+    # Prepare data for AI analysis as compact TSV to keep input tokens low;
+    # company names stay local and are filled back in after parsing
+    stocks_summary = [STOCKS_TSV_HEADER]
     for stock in stocks_data:
-        stocks_summary.append(
-            f"{stock['symbol']} ({stock['name']}) - ${stock['current_price']}\n"
-            f"  Sector: {stock['sector']} | Industry: {stock['industry']}\n"
-            f"  Market Cap: ${stock['market_cap']:,} | P/E: {stock['pe_ratio']}\n"
-            f"  Performance: 1D: {stock['price_change_1d']}%, 1W: {stock['price_change_1w']}%, "
-            f"1M: {stock['price_change_1m']}%, 3M: {stock['price_change_3m']}%\n"
-            f"  Volume Ratio: {stock['volume_ratio']}x | Analyst Target: ${stock['analyst_target']}\n"
-            f"  Recommendation: {stock['recommendation']}\n"
-        )
+        stocks_summary.append("\t".join(str(stock[field]) for field in STOCKS_TSV_FIELDS))
+    names = {stock['symbol']: stock['name'] for stock in stocks_data}
 
     prompt = f"""You are a professional stock analyst. Today is {datetime.now().strftime('%Y-%m-%d')}.
 
@@ -86,90 +241,70 @@ Analyze the following {len(stocks_data)} US stocks and select the TOP 5 BEST PIC
 4. Analyst recommendations
 5. Current market conditions
 
-STOCKS DATA:
+STOCKS DATA (tab-separated; columns: {STOCKS_TSV_HEADER.replace(chr(9), ',')}):
 {chr(10).join(stocks_summary)}
 
-Provide your analysis in this EXACT JSON format:
-{{
-  "analysis_date": "{datetime.now().strftime('%Y-%m-%d')}",
-  "market_summary": "Brief 2-3 sentence market overview",
-  "top_picks": [
-    {{
-      "rank": 1,
-      "symbol": "SYMBOL",
-      "name": "Company Name",
-      "current_price": 123.45,
-      "reason": "Detailed 2-3 sentence reason for this pick",
-      "target_price": 150.00,
-      "risk_level": "Low/Medium/High",
-      "time_horizon": "Short/Medium/Long-term"
-    }}
-  ],
-  "overall_strategy": "2-3 sentences on recommended overall strategy"
-}}
-
-Return ONLY valid JSON, no markdown or explanations."""
+Column notes: price, mcap and tgt (analyst mean target) are in USD; 1d/1w/1m/3m
+are % price changes; vol is today's volume vs. the 3-month average; rec is the
+analyst recommendation.
+
+Respond with analysis_date "{datetime.now().strftime('%Y-%m-%d')}", a brief 2-3 sentence
+market_summary, exactly 5 top_picks ranked 1-5 (each with a detailed 2-3 sentence
+reason), and 2-3 sentences of overall_strategy."""
 
     try:
-        response = client.chat.completions.create(
+        stream = client.chat.completions.create(
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "You are an expert stock analyst providing data-driven investment recommendations."},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.3,
-            max_tokens=2000
+            max_tokens=1000,
+            response_format={
+                "type": "json_schema",
+                "json_schema": {"name": "stock_picks", "schema": ANALYSIS_SCHEMA, "strict": True}
+            },
+            stream=True
         )
 
-        result = response.choices[0].message.content.strip()
-        # Remove markdown code blocks if present
-        if result.startswith('```'):
-            result = result.split('```')[1]
-            if result.startswith('json'):
-                result = result[4:]
-            result = result.strip()
+        # Collect the JSON as it is generated; it is parsed once complete
+        chunks = []
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                chunks.append(chunk.choices[0].delta.content)
 
-        return json.loads(result)
+        analysis = json.loads("".join(chunks))
+        for pick in analysis['top_picks']:
+            pick['name'] = names.get(pick['symbol'], pick['symbol'])
+        return analysis
     except Exception as e:
         print(f"Error with AI analysis: {e}")
         return None
 
-def send_email_notification(analysis):
-    """Send email with stock picks using a simple email service"""
-    # Using Mailgun API (you can use SendGrid, AWS SES, etc.)
-    mailgun_domain = os.environ.get('MAILGUN_DOMAIN')
-    mailgun_api_key = os.environ.get('MAILGUN_API_KEY')
-    recipient_email = os.environ.get('RECIPIENT_EMAIL')
-
-    if not all([mailgun_domain, mailgun_api_key, recipient_email]):
-        print("Email credentials not configured, skipping email")
-        return False
-
-    # Format email content
-    email_body = f"""
-<h2>🚀 Daily Top 5 US Stock Picks - {analysis['analysis_date']}</h2>
+EMAIL_HEADER_TEMPLATE = """
+<h2>🚀 Daily Top 5 US Stock Picks - {analysis_date}</h2>
 
 <h3>📊 Market Summary</h3>
-<p>{analysis['market_summary']}</p>
+<p>{market_summary}</p>
 
 <h3>🎯 Top 5 Stock Picks</h3>
 """
 
-    for pick in analysis['top_picks']:
-        email_body += f"""
+EMAIL_PICK_TEMPLATE = """
 <div style="border: 1px solid #ddd; padding: 15px; margin: 10px 0; border-radius: 5px;">
-    <h4>#{pick['rank']} - {pick['symbol']} ({pick['name']})</h4>
-    <p><strong>Current Price:</strong> ${pick['current_price']}</p>
-    <p><strong>Target Price:</strong> ${pick['target_price']}</p>
-    <p><strong>Risk Level:</strong> {pick['risk_level']}</p>
-    <p><strong>Time Horizon:</strong> {pick['time_horizon']}</p>
-    <p><strong>Analysis:</strong> {pick['reason']}</p>
+    <h4>#{rank} - {symbol} ({name})</h4>
+    <p><strong>Current Price:</strong> ${current_price}</p>
+    <p><strong>Target Price:</strong> ${target_price}</p>
+    <p><strong>Risk Level:</strong> {risk_level}</p>
+    <p><strong>Time Horizon:</strong> {time_horizon}</p>
+    <p><strong>Analysis:</strong> {reason}</p>
 </div>
 """
 
-    email_body += f"""
+EMAIL_FOOTER_TEMPLATE = """
 <h3>📈 Strategy Recommendation</h3>
-<p>{analysis['overall_strategy']}</p>
+<p>{overall_strategy}</p>
 
 <hr>
 <p style="color: #666; font-size: 12px;">
@@ -178,6 +313,24 @@ Not financial advice. Always do your own research and consult with a financial a
 </p>
 """
 
+def send_email_notification(analysis):
+    """Send email with stock picks using a simple email service"""
+    # Using Mailgun API (you can use SendGrid, AWS SES, etc.)
+    mailgun_domain = os.environ.get('MAILGUN_DOMAIN')
+    mailgun_api_key = os.environ.get('MAILGUN_API_KEY')
+    recipient_email = os.environ.get('RECIPIENT_EMAIL')
+
+    if not all([mailgun_domain, mailgun_api_key, recipient_email]):
+        print("Email credentials not configured, skipping email")
+        return False
+
+    # Format email content
+    parts = [EMAIL_HEADER_TEMPLATE.format(**analysis)]
+    for pick in analysis['top_picks']:
+        parts.append(EMAIL_PICK_TEMPLATE.format(**pick))
+    parts.append(EMAIL_FOOTER_TEMPLATE.format(**analysis))
+    email_body = "".join(parts)
+
     try:
         response = requests.post(
             f"https://api.mailgun.net/v3/{mailgun_domain}/messages",
@@ -194,47 +347,52 @@ Not financial advice. Always do your own research and consult with a financial a
         print(f"Error sending email: {e}")
         return False
 
-def create_github_issue(analysis, repo_token):
-    """Create a GitHub issue with the analysis"""
-    repo = os.environ.get('GITHUB_REPOSITORY')
-
-    if not repo or not repo_token:
-        print("GitHub repository info not available")
-        return False
-
-    issue_body = f"""## 📊 Daily Stock Analysis - {analysis['analysis_date']}
+ISSUE_HEADER_TEMPLATE = """## 📊 Daily Stock Analysis - {analysis_date}
 
 ### Market Summary
-{analysis['market_summary']}
+{market_summary}
 
 ### 🎯 Top 5 Stock Picks
 
 """
 
-    for pick in analysis['top_picks']:
-        issue_body += f"""
-#### #{pick['rank']} - {pick['symbol']} ({pick['name']})
+ISSUE_PICK_TEMPLATE = """
+#### #{rank} - {symbol} ({name})
 
-- **Current Price:** ${pick['current_price']}
-- **Target Price:** ${pick['target_price']}
-- **Risk Level:** {pick['risk_level']}
-- **Time Horizon:** {pick['time_horizon']}
+- **Current Price:** ${current_price}
+- **Target Price:** ${target_price}
+- **Risk Level:** {risk_level}
+- **Time Horizon:** {time_horizon}
 
-**Analysis:** {pick['reason']}
+**Analysis:** {reason}
 
 ---
 
 """
 
-    issue_body += f"""
+ISSUE_FOOTER_TEMPLATE = """
 ### 📈 Overall Strategy
-{analysis['overall_strategy']}
+{overall_strategy}
 
 ---
 
 *Automated analysis generated using AI. Not financial advice. DYOR.*
 """
 
+def create_github_issue(analysis, repo_token):
+    """Create a GitHub issue with the analysis"""
+    repo = os.environ.get('GITHUB_REPOSITORY')
+
+    if not repo or not repo_token:
+        print("GitHub repository info not available")
+        return False
+
+    parts = [ISSUE_HEADER_TEMPLATE.format(**analysis)]
+    for pick in analysis['top_picks']:
+        parts.append(ISSUE_PICK_TEMPLATE.format(**pick))
+    parts.append(ISSUE_FOOTER_TEMPLATE.format(**analysis))
+    issue_body = "".join(parts)
+
     try:
         response = requests.post(
             f"https://api.github.com/repos/{repo}/issues",
@@ -253,17 +411,54 @@ def create_github_issue(analysis, repo_token):
         print(f"Error creating GitHub issue: {e}")
         return False
 
+def fetch_stocks_data(symbols, deep=False):
+    """Fetch and compute metrics for all symbols"""
+    histories = {}
+    for i in range(0, len(symbols), HISTORY_BATCH_SIZE):
+        histories.update(fetch_history_batch(symbols[i:i + HISTORY_BATCH_SIZE]))
+
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+        infos = list(executor.map(lambda symbol: fetch_info(symbol, deep), symbols))
+
+    results = [
+        get_stock_data(symbol, histories.get(symbol), info)
+        for symbol, info in zip(symbols, infos)
+    ]
+    return [data for data in results if data]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Daily US Stock Analyzer")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Ignore cached stock data and fetch everything fresh")
+    parser.add_argument('--deep', action='store_true',
+                        help="Also fetch company name, P/E, sector and analyst data "
+                             "(slower; used by the scheduled workflow - without it those "
+                             "fields are N/A, which is only suitable for quick local runs)")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
     print(f"Starting stock analysis for {datetime.now().strftime('%Y-%m-%d')}")
 
-    # Fetch stock data
+    # Fetch stock data, reusing today's cache where possible
     print(f"Fetching data for {len(STOCK_SYMBOLS)} stocks...")
-    stocks_data = []
-    for symbol in STOCK_SYMBOLS:
-        data = get_stock_data(symbol)
-        if data:
-            stocks_data.append(data)
-            print(f"  ✓ {symbol}: ${data['current_price']}")
+    cached = {} if args.no_cache else load_cached_stock_data(args.deep)
+    missing = [symbol for symbol in STOCK_SYMBOLS if symbol not in cached]
+    if cached:
+        print(f"  Using cached data for {len(STOCK_SYMBOLS) - len(missing)} stocks")
+
+    fetched = fetch_stocks_data(missing, args.deep) if missing else []
+    if fetched:
+        save_cached_stock_data(fetched, args.deep)
+
+    fetched_by_symbol = {data['symbol']: data for data in fetched}
+    stocks_data = [
+        cached.get(symbol) or fetched_by_symbol[symbol]
+        for symbol in STOCK_SYMBOLS
+        if symbol in cached or symbol in fetched_by_symbol
+    ]
+    for data in stocks_data:
+        print(f"  ✓ {data['symbol']}: ${data['current_price']}")
 
     print(f"\nSuccessfully fetched data for {len(stocks_data)} stocks")
 
@@ -298,13 +493,16 @@ def main():
         json.dump(analysis, f, indent=2)
     print("\n✓ Saved analysis to latest_stock_picks.json")
 
-    # Send notifications
+    # Send notifications; the two POSTs are independent so run them together
     github_token = os.environ.get('GITHUB_TOKEN')
-    if github_token:
-        if create_github_issue(analysis, github_token):
-            print("✓ Created GitHub issue with analysis")
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        issue_future = executor.submit(create_github_issue, analysis, github_token) if github_token else None
+        email_future = executor.submit(send_email_notification, analysis)
+
+    if issue_future and issue_future.result():
+        print("✓ Created GitHub issue with analysis")
 
-    if send_email_notification(analysis):
+    if email_future.result():
         print("✓ Sent email notification")
 
     print("\n✅ Analysis complete!")
@@ -2,20 +2,89 @@
 """
 Web Security Auditor - Defensive Security Analysis
 Checks for common security vulnerabilities without exploitation
+
+Requirements: pip install requests "selectolax>=0.3.17"
 """
 
 import requests
 import re
+import charset_normalizer
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse, urljoin
+from requests.adapters import HTTPAdapter
+from selectolax.lexbor import LexborHTMLParser
+
+PROBE_WORKERS = 10
+USER_AGENT = 'security-audit/1.0'
+# Bound how much of a page body is downloaded and scanned
+MAX_HTML_BYTES = 4 * 1024 * 1024
+
+COMMON_FILES = [
+    '.git/config',
+    '.env',
+    '.env.local',
+    '.env.production',
+    'config.php',
+    'wp-config.php',
+    '.htaccess',
+    'phpinfo.php',
+    'admin',
+    'administrator',
+    'wp-admin',
+    'phpmyadmin',
+    'backup.zip',
+    'backup.sql',
+    'database.sql',
+    'robots.txt',
+    'sitemap.xml',
+    '.DS_Store',
+    'package.json',
+    'composer.json',
+    '.git/HEAD',
+]
+
+COMMENT_RE = re.compile(r'<!--(.*?)-->', re.DOTALL)
+SENSITIVE_KEYWORD_RE = re.compile(r'password|key|secret|token|api')
+EMAIL_RE = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+API_KEY_RE = re.compile(
+    r'(api[_-]?key|token|secret|password)["\']?\s*[:=]\s*["\']([^"\']{20,})["\']',
+    re.IGNORECASE
+)
+VERSION_RE = re.compile(
+    r'version["\']?\s*[:=]\s*["\']?([0-9]+\.[0-9]+\.[0-9]+)',
+    re.IGNORECASE
+)
+
+def create_session():
+    """Create a session whose connection pool is shared by every check"""
+    session = requests.Session()
+    session.headers.update({'User-Agent': USER_AGENT})
+    # One slot per probe thread plus the streamed page response, which keeps
+    # its connection until read_html() runs after the probes finish
+    adapter = HTTPAdapter(pool_connections=PROBE_WORKERS, pool_maxsize=PROBE_WORKERS + 1)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def fetch_page(session, url):
+    """Fetch the audited page, returning (response, error)"""
+    try:
+        # Stream so the body is only read (and capped) by read_html()
+        return session.get(url, timeout=10, allow_redirects=True, stream=True), None
+    except Exception as e:
+        return None, e
 
-def check_security_headers(url):
+def check_security_headers(response, error=None):
     """Check for important security headers"""
     print("\n" + "="*60)
     print("🔒 SECURITY HEADERS ANALYSIS")
     print("="*60)
 
+    if error is not None:
+        print(f"❌ Error: {error}")
+        return None
+
     try:
-        response = requests.get(url, timeout=10, allow_redirects=True)
         headers = response.headers
 
         security_headers = {
@@ -65,48 +134,38 @@ def check_security_headers(url):
         print(f"❌ Error: {e}")
         return None
 
-def check_common_files(base_url):
+def probe_common_files(session, base_url):
+    """Request each of COMMON_FILES, returning (file, status_code) pairs"""
+    def probe(file):
+        url = urljoin(base_url, file)
+        try:
+            # HEAD avoids downloading bodies; fall back to GET if it's not allowed
+            response = session.head(url, timeout=5, allow_redirects=False)
+            if response.status_code == 405:
+                response = session.get(url, timeout=5, allow_redirects=False, stream=True)
+                response.close()
+            return file, response.status_code
+        except:
+            return file, None
+
+    with ThreadPoolExecutor(max_workers=PROBE_WORKERS) as executor:
+        results = list(executor.map(probe, COMMON_FILES))
+
+    return results
+
+def check_common_files(results):
     """Check for exposed sensitive files"""
     print("\n" + "="*60)
     print("📁 EXPOSED FILES CHECK")
     print("="*60)
 
-    common_files = [
-        '.git/config',
-        '.env',
-        '.env.local',
-        '.env.production',
-        'config.php',
-        'wp-config.php',
-        '.htaccess',
-        'phpinfo.php',
-        'admin',
-        'administrator',
-        'wp-admin',
-        'phpmyadmin',
-        'backup.zip',
-        'backup.sql',
-        'database.sql',
-        'robots.txt',
-        'sitemap.xml',
-        '.DS_Store',
-        'package.json',
-        'composer.json',
-        '.git/HEAD',
-    ]
-
     exposed = []
     safe = 0
 
-    for file in common_files:
-        url = urljoin(base_url, file)
-        try:
-            response = requests.get(url, timeout=5, allow_redirects=False)
-            if response.status_code == 200:
-                exposed.append(f"⚠️  EXPOSED: {file} (Status: {response.status_code})")
-            else:
-                safe += 1
-        except:
+    for file, status_code in results:
+        if status_code == 200:
+            exposed.append(f"⚠️  EXPOSED: {file} (Status: {status_code})")
+        else:
             safe += 1
 
     if exposed:
@@ -116,38 +175,76 @@ def check_common_files(base_url):
     else:
         print("\n✅ No common sensitive files exposed")
 
-    print(f"\n📊 Summary: {safe}/{len(common_files)} files properly protected")
+    print(f"\n📊 Summary: {safe}/{len(results)} files properly protected")
+
+def read_html(response):
+    """Read the response body in chunks, stopping at MAX_HTML_BYTES"""
+    if not response:
+        return None
 
-def analyze_html_content(response):
+    chunks = []
+    size = 0
+    try:
+        for chunk in response.iter_content(chunk_size=65536):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= MAX_HTML_BYTES:
+                print(f"\n⚠️  Page larger than {MAX_HTML_BYTES // (1024 * 1024)} MB - analyzing first part only")
+                break
+    except requests.exceptions.RequestException as e:
+        print(f"❌ Error reading page body: {e}")
+    finally:
+        response.close()
+
+    body = b"".join(chunks)[:MAX_HTML_BYTES]
+
+    # Decode like response.text: guess the charset when none is declared
+    # (apparent_encoding can't be used once the stream is consumed) and
+    # fall back to the default codec for unknown or missing charsets
+    encoding = response.encoding
+    if encoding is None:
+        encoding = charset_normalizer.detect(body)['encoding']
+    try:
+        return str(body, encoding, errors='replace')
+    except (LookupError, TypeError):
+        return str(body, errors='replace')
+
+def analyze_html_content(html):
     """Analyze HTML for security issues"""
     print("\n" + "="*60)
     print("🔍 HTML CONTENT ANALYSIS")
     print("="*60)
 
-    if not response:
+    if html is None:
         return
 
-    html = response.text
+    # Scripts and forms come from a real parse; comments, emails and keys
+    # have no structural anchor so they stay regex-based
+    tree = LexborHTMLParser(html)
+    comments = COMMENT_RE.findall(html)
+    inline_scripts = tree.css('script')
+    external_scripts = [
+        node.attributes['src'] for node in tree.css('script[src]')
+        if node.attributes.get('src')
+    ]
+    forms = tree.css('form')
 
     # Check for comments with sensitive info
-    comments = re.findall(r'<!--(.*?)-->', html, re.DOTALL)
     if comments:
         print(f"\n💬 Found {len(comments)} HTML comments:")
         for i, comment in enumerate(comments[:5], 1):
             cleaned = comment.strip()[:100]
-            if any(keyword in cleaned.lower() for keyword in ['password', 'key', 'secret', 'token', 'api']):
+            if SENSITIVE_KEYWORD_RE.search(cleaned.lower()):
                 print(f"  ⚠️  Comment {i} contains sensitive keywords: {cleaned}")
             else:
                 print(f"  ℹ️  Comment {i}: {cleaned}")
 
     # Check for inline scripts
-    inline_scripts = re.findall(r'<script[^>]*>(.*?)</script>', html, re.DOTALL)
     print(f"\n📜 Inline Scripts: {len(inline_scripts)} found")
     if len(inline_scripts) > 10:
         print("  ⚠️  Many inline scripts - Consider using CSP")
 
     # Check for external scripts
-    external_scripts = re.findall(r'<script[^>]*src=["\']([^"\']+)["\']', html)
     if external_scripts:
         print(f"\n🌐 External Scripts ({len(external_scripts)}):")
         for script in external_scripts[:10]:
@@ -155,33 +252,32 @@ def analyze_html_content(response):
             print(f"  - {domain or 'relative path'}: {script[:60]}")
 
     # Check for forms
-    forms = re.findall(r'<form[^>]*>(.*?)</form>', html, re.DOTALL | re.IGNORECASE)
     if forms:
         print(f"\n📋 Forms Found: {len(forms)}")
         for i, form in enumerate(forms, 1):
-            if 'csrf' not in form.lower() and 'token' not in form.lower():
+            form_html = form.html.lower()
+            if 'csrf' not in form_html and 'token' not in form_html:
                 print(f"  ⚠️  Form {i}: No CSRF token detected")
-            if 'action=' in form.lower():
-                action = re.search(r'action=["\']([^"\']+)["\']', form, re.IGNORECASE)
-                if action:
-                    print(f"  → Action: {action.group(1)}")
+            action = form.attributes.get('action')
+            if action:
+                print(f"  → Action: {action}")
 
     # Check for email addresses
-    emails = re.findall(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', html)
+    emails = EMAIL_RE.findall(html)
     if emails:
         print(f"\n📧 Email Addresses Exposed: {len(set(emails))}")
         for email in list(set(emails))[:5]:
             print(f"  - {email}")
 
     # Check for API keys or tokens in HTML
-    potential_keys = re.findall(r'(api[_-]?key|token|secret|password)["\']?\s*[:=]\s*["\']([^"\']{20,})["\']', html, re.IGNORECASE)
+    potential_keys = API_KEY_RE.findall(html)
     if potential_keys:
         print(f"\n⚠️  CRITICAL: Potential API keys/secrets in HTML:")
         for key_type, key_value in potential_keys:
             print(f"  - {key_type}: {key_value[:20]}...")
 
-def check_ssl_tls(url):
-    """Check SSL/TLS configuration"""
+def check_ssl_tls(url, error=None):
+    """Check SSL/TLS configuration using the outcome of the page fetch"""
     print("\n" + "="*60)
     print("🔐 SSL/TLS ANALYSIS")
     print("="*60)
@@ -193,13 +289,15 @@ def check_ssl_tls(url):
         print("  Recommendation: Enable HTTPS immediately")
     elif parsed.scheme == 'https':
         print("  ✅ Site uses HTTPS")
-        try:
-            response = requests.get(url, timeout=10)
+        # The page fetch verifies the certificate, so no second request is needed
+        if error is None:
             print(f"  ✅ SSL certificate valid")
-        except requests.exceptions.SSLError as e:
-            print(f"  ❌ SSL Error: {e}")
+        elif isinstance(error, requests.exceptions.SSLError):
+            print(f"  ❌ SSL Error: {error}")
+        else:
+            print(f"  ❌ Could not verify certificate: {error}")
 
-def check_information_disclosure(response):
+def check_information_disclosure(response, html):
     """Check for information disclosure"""
     print("\n" + "="*60)
     print("ℹ️  INFORMATION DISCLOSURE")
@@ -221,8 +319,7 @@ def check_information_disclosure(response):
         print("  ⚠️  Technology stack exposed - consider removing")
 
     # Check for version numbers in HTML
-    html = response.text
-    versions = re.findall(r'version["\']?\s*[:=]\s*["\']?([0-9]+\.[0-9]+\.[0-9]+)', html, re.IGNORECASE)
+    versions = VERSION_RE.findall(html)
     if versions:
         print(f"  ⚠️  Version numbers found in HTML: {set(versions)}")
 
@@ -262,12 +359,21 @@ def main():
     print(f"\n🔍 Starting Security Audit for: {url}")
     print(f"⏰ Time: {requests.utils.default_headers()}")
 
-    # Run all checks
-    check_ssl_tls(url)
-    response = check_security_headers(url)
-    check_common_files(url)
-    analyze_html_content(response)
-    check_information_disclosure(response)
+    with create_session() as session:
+        # Network requests are independent, so run them concurrently and
+        # report on the results in order
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            page_future = executor.submit(fetch_page, session, url)
+            files_future = executor.submit(probe_common_files, session, url)
+
+        # Run all checks
+        response, error = page_future.result()
+        check_ssl_tls(url, error)
+        response = check_security_headers(response, error)
+        check_common_files(files_future.result())
+        html = read_html(response)
+        analyze_html_content(html)
+        check_information_disclosure(response, html)
     generate_recommendations(url)
 
     print("\n" + "="*60)